@@ -1,17 +1,25 @@
 import io
 import os
+import re
+import smtplib
 import json
 import copy
+import atexit
+import hashlib
 import threading
-from datetime import datetime
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from html import escape
+from datetime import datetime, timedelta
 from decimal import Decimal, ROUND_HALF_UP
 
 from flask import (
     Flask, render_template, session, redirect, url_for,
     request, flash, jsonify, Response
 )
-from flask_mail import Mail, Message
+from flask_mail import Mail, Message, Connection
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -24,8 +32,157 @@ try:
 except Exception:  # redis lib not installed
     redis = None
 
+# Optional Flask-Session (server-side sessions; only used together with Redis)
+try:
+    from flask_session import Session
+except Exception:  # flask-session lib not installed
+    Session = None
+
+# Optional orjson (faster products.json parsing)
+try:
+    import orjson
+except Exception:  # orjson lib not installed
+    orjson = None
+
 from config import DevelopmentConfig, ProductionConfig, TestingConfig
 
+TIME_FMT = "%Y-%m-%d %H:%M"
+
+# ----------------- Catalog -----------------
+# Immutable product record; attribute access is cheaper than dict subscripts
+Product = namedtuple("Product", "id name category price currency image price_cents name_lc cat_lc")
+
+def load_products(path: str) -> list:
+    with open(path, "rb") as f:
+        raw = f.read()
+    data = orjson.loads(raw) if orjson else json.loads(raw)
+    # Prices are kept as integer cents; only formatted at the template boundary
+    return [
+        Product(
+            id=int(p["id"]),
+            name=p["name"],
+            category=p["category"],
+            price=p["price"],
+            currency=p.get("currency", "$"),
+            image=p.get("image"),
+            price_cents=int(Decimal(str(p["price"])).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP) * 100),
+            name_lc=p["name"].lower(),
+            cat_lc=p["category"].lower(),
+        )
+        for p in data
+    ]
+
+# ----------------- Telegram HTTP session -----------------
+# One pooled session so keep-alive reuses the TLS connection across notifications
+TG_SESSION = requests.Session()
+TG_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+# ----------------- SMTP with PIPELINING (RFC 2920) -----------------
+class _PipeliningMixin:
+    """Send MAIL FROM / RCPT TO / DATA in one write when the server allows it."""
+
+    def sendmail(self, from_addr, to_addrs, msg, mail_options=(), rcpt_options=()):
+        self.ehlo_or_helo_if_needed()
+        if not self.has_extn("pipelining"):
+            return super().sendmail(from_addr, to_addrs, msg, mail_options, rcpt_options)
+
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        if isinstance(msg, str):
+            msg = re.sub(r"(?:\r\n|\n|\r(?!\n))", "\r\n", msg).encode("ascii")
+
+        mail_opts = list(mail_options)
+        if self.has_extn("size"):
+            mail_opts.append("size=%d" % len(msg))
+        rcpt_opts = list(rcpt_options)
+
+        def cmd(verb, addr, opts):
+            line = "%s:%s" % (verb, smtplib.quoteaddr(addr))
+            if opts:
+                line += " " + " ".join(opts)
+            if "\r" in line or "\n" in line:
+                raise ValueError("command contains CR or LF")
+            return (line + "\r\n").encode(self.command_encoding)
+
+        batch = [cmd("MAIL FROM", from_addr, mail_opts)]
+        batch += [cmd("RCPT TO", each, rcpt_opts) for each in to_addrs]
+        batch.append(b"DATA\r\n")
+        self.send(b"".join(batch))
+
+        def abort(code, exc):
+            # like smtplib: 421 means the server is closing the channel, so don't send RSET
+            if code == 421:
+                self.close()
+            else:
+                self._rset()
+            raise exc
+
+        # replies come back in the same order the commands were sent
+        mail_code, mail_resp = self.getreply()
+        if mail_code == 421:
+            abort(mail_code, smtplib.SMTPSenderRefused(mail_code, mail_resp, from_addr))
+        senderrs = {}
+        for each in to_addrs:
+            code, resp = self.getreply()
+            if code not in (250, 251):
+                senderrs[each] = (code, resp)
+            if code == 421:
+                abort(code, smtplib.SMTPRecipientsRefused(senderrs))
+        data_code, data_resp = self.getreply()
+        if data_code == 421:
+            abort(data_code, smtplib.SMTPDataError(data_code, data_resp))
+
+        failed = mail_code != 250 or len(senderrs) == len(to_addrs)
+        if data_code == 354 and failed:
+            # server accepted DATA anyway; terminate the empty message before resetting
+            self.send(b".\r\n")
+            self.getreply()
+        if mail_code != 250:
+            abort(mail_code, smtplib.SMTPSenderRefused(mail_code, mail_resp, from_addr))
+        if len(senderrs) == len(to_addrs):
+            self._rset()
+            raise smtplib.SMTPRecipientsRefused(senderrs)
+        if data_code != 354:
+            abort(data_code, smtplib.SMTPDataError(data_code, data_resp))
+
+        q = re.sub(rb"(?m)^\.", b"..", msg)
+        if q[-2:] != b"\r\n":
+            q += b"\r\n"
+        self.send(q + b".\r\n")
+        code, resp = self.getreply()
+        if code != 250:
+            abort(code, smtplib.SMTPDataError(code, resp))
+        return senderrs
+
+
+class PipeliningSMTP(_PipeliningMixin, smtplib.SMTP):
+    pass
+
+
+class PipeliningSMTP_SSL(_PipeliningMixin, smtplib.SMTP_SSL):
+    pass
+
+
+class PipeliningConnection(Connection):
+    """Flask-Mail connection that uses the pipelining SMTP clients above."""
+
+    def __init__(self, mail, timeout: int = 15):
+        super().__init__(mail)
+        # socket timeout: a stalled server must not hold a notify pool thread forever
+        self.timeout = timeout
+
+    def configure_host(self):
+        if self.mail.use_ssl:
+            host = PipeliningSMTP_SSL(self.mail.server, self.mail.port, timeout=self.timeout)
+        else:
+            host = PipeliningSMTP(self.mail.server, self.mail.port, timeout=self.timeout)
+        host.set_debuglevel(int(self.mail.debug))
+        if self.mail.use_tls:
+            host.starttls()
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+        return host
+
 # ----------------- Redis helpers (optional) -----------------
 _r = None
 if os.getenv("REDIS_URL") and redis is not None:
@@ -82,42 +239,37 @@ def release_notify_lock(md5: str):
             pass
 
 # ----------------- TG message builder -----------------
-def build_tg_lines(order: dict) -> str:
-    from html import escape
-    from decimal import Decimal, ROUND_HALF_UP
+def fmt_amount(dec: Decimal, cur: str) -> str:
+    cur = (cur or "USD").upper()
+    if cur == "KHR":
+        # បង្គត់ទៅជាទីកន្លែង 100៛
+        return str(int((dec / Decimal("100")).quantize(Decimal("1"), rounding=ROUND_HALF_UP)) * 100)
+    return str(dec.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
 
-    def fmt_amount(dec: Decimal, cur: str) -> str:
-        cur = (cur or "USD").upper()
-        if cur == "KHR":
-            # បង្គត់ទៅជាទីកន្លែង 100៛
-            return str(int((dec / Decimal("100")).quantize(Decimal("1"), rounding=ROUND_HALF_UP)) * 100)
-        return str(dec.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
 
+def build_tg_lines(order: dict) -> str:
     cust = order.get("customer", {}) or {}
     items = order.get("items", []) or []
     currency = (order.get("currency") or "USD").upper()
     fx = Decimal(str(order.get("fx_rate") or "0")) if currency == "KHR" else Decimal("0")
 
-    lines = [
-        "<b>New Paid Order</b>",
-        f"Name: {escape(cust.get('name',''))}",
-        f"Email: {escape(cust.get('email',''))}",
-        f"Phone: {escape(cust.get('phone',''))}",
-        f"Address: {escape(cust.get('address',''))}",
-        "",
-        "Items:",
-    ]
+    buf = io.StringIO()
+    w = buf.write
+    w("<b>New Paid Order</b>\nName: %s\nEmail: %s\nPhone: %s\nAddress: %s\n\nItems:\n" % (
+        escape(cust.get("name", "")),
+        escape(cust.get("email", "")),
+        escape(cust.get("phone", "")),
+        escape(cust.get("address", "")),
+    ))
     for it in items:
-        name = escape(str(it.get("name","")))
-        qty = int(it.get("qty", 1))
         line_total = Decimal(str(it.get("line_total", "0")))
         if fx > 0:
             line_total = line_total * fx
-        lines.append(f"- {qty} x {name} ({fmt_amount(line_total, currency)} {currency})")
-
-    lines.append(f"\nSubtotal: {order.get('subtotal','0')} {currency}")
-    lines.append(f"Time: {datetime.now():%Y-%m-%d %H:%M}")
-    return "\n".join(lines)
+        w("- %d x %s (%s %s)\n" % (
+            int(it.get("qty", 1)), escape(str(it.get("name", ""))), fmt_amount(line_total, currency), currency
+        ))
+    w("\nSubtotal: %s %s\nTime: %s" % (order.get("subtotal", "0"), currency, datetime.now().strftime(TIME_FMT)))
+    return buf.getvalue()
 
 
 # ----------------- App factory -----------------
@@ -142,32 +294,76 @@ def create_app():
     app.config.setdefault("SESSION_COOKIE_SAMESITE", "Lax")
     app.config.setdefault("SECRET_KEY", os.getenv("SECRET_KEY", "change-me"))
 
+    # Server-side sessions in Redis (msgpack-encoded) so the cookie only carries the session id
+    if os.getenv("REDIS_URL") and redis is not None and Session is not None:
+        app.config.setdefault("SESSION_TYPE", "redis")
+        # binary client: Flask-Session stores raw msgpack bytes
+        app.config.setdefault("SESSION_REDIS", redis.from_url(os.getenv("REDIS_URL")))
+        app.config.setdefault("SESSION_SERIALIZATION_FORMAT", "msgpack")
+        app.config.setdefault("SESSION_KEY_PREFIX", "session:")
+        Session(app)
+
     mail = Mail(app)
 
+    def mail_connect():
+        """Open one SMTP session; send several messages with `with mail_connect() as conn`."""
+        return PipeliningConnection(app.extensions["mail"], timeout=app.config.get("MAIL_TIMEOUT", 15))
+
+    # Background pool for Telegram/SMTP so request handlers don't wait on network I/O
+    notify_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="notify")
+    app.extensions["notify_pool"] = notify_pool
+    atexit.register(notify_pool.shutdown, wait=True)
+
     # Load products
-    with open(os.path.join(app.root_path, "products.json"), "r", encoding="utf-8") as f:
-        PRODUCTS = json.load(f)
+    PRODUCTS = load_products(os.path.join(app.root_path, "products.json"))
+    # Session cart keys round-trip through the cookie as strings, so index by str(id)
+    PRODUCTS_BY_ID = {str(p.id): p for p in PRODUCTS}
+    # The catalog never changes at runtime, so the category lists are built once
+    CATEGORIES = tuple(sorted({p.category for p in PRODUCTS}))
+    CATEGORIES_WITH_ALL = ("All",) + CATEGORIES
+
+    # Lowercase category -> products index for /products
+    BY_CATEGORY = defaultdict(list)
+    for p in PRODUCTS:
+        BY_CATEGORY[p.cat_lc].append(p)
+    BY_CATEGORY["all"] = PRODUCTS
+    BY_CATEGORY = dict(BY_CATEGORY)
+
+    # Fingerprint of the catalog + the templates /products renders, for its ETag
+    _etag_src = hashlib.blake2b(digest_size=8)
+    for rel in ("products.json", "templates/products.html", "templates/base.html"):
+        with open(os.path.join(app.root_path, rel), "rb") as f:
+            _etag_src.update(f.read())
+    PRODUCTS_ETAG = _etag_src.hexdigest()
 
     # Helpers
-    def _money(x):
-        return Decimal(x).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    def fmt_cents(c: int) -> str:
+        return f"{c // 100}.{c % 100:02d}"
+
+    def get_cart_count() -> int:
+        # read-only: sessions from before cart_count was tracked derive it from the cart;
+        # only the cart mutations store it, so anonymous page views never create a session
+        c = session.get("cart_count")
+        return c if c is not None else sum(int(q) for q in session.get("cart", {}).values())
 
     def cart_items():
         cart = session.get("cart", {})
         items = []
+        subtotal_cents = 0
         for pid, qty in cart.items():
-            product = next((p for p in PRODUCTS if p["id"] == int(pid)), None)
+            product = PRODUCTS_BY_ID.get(pid)
             if product:
-                line_total = _money(Decimal(product["price"]) * Decimal(qty))
+                qty = int(qty)
+                line_cents = product.price_cents * qty
+                subtotal_cents += line_cents
                 items.append({
-                    "id": product["id"],
-                    "name": product["name"],
-                    "price": _money(product["price"]),
-                    "qty": int(qty),
-                    "line_total": line_total
+                    "id": product.id,
+                    "name": product.name,
+                    "price": fmt_cents(product.price_cents),
+                    "qty": qty,
+                    "line_total": fmt_cents(line_cents)
                 })
-        subtotal = _money(sum(i["line_total"] for i in items)) if items else _money(0)
-        return items, subtotal
+        return items, fmt_cents(subtotal_cents)
 
     BAKONG_ACCOUNT = os.getenv("BAKONG_ACCOUNT", "sothun_thoeun@aclb")
     MERCHANT_NAME = os.getenv("MERCHANT_NAME", "SOTHUN THOEUN")
@@ -191,16 +387,17 @@ def create_app():
     def usd_to_khr(usd: Decimal) -> Decimal:
         return (usd * EXCHANGE_RATE_KHR).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
 
+    TG_TOKEN = app.config.get("TELEGRAM_BOT_TOKEN")
+    TG_CHAT_ID = app.config.get("TELEGRAM_CHAT_ID")
+    TG_URL = f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage" if TG_TOKEN else None
+
     def send_telegram(text: str) -> bool:
-        token = app.config.get("TELEGRAM_BOT_TOKEN")
-        chat_id = app.config.get("TELEGRAM_CHAT_ID")
-        if not token or not chat_id:
+        if not TG_URL or not TG_CHAT_ID:
             app.logger.error("[Telegram] Missing TELEGRAM_BOT_TOKEN or TELEGRAM_CHAT_ID")
             return False
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
+        payload = {"chat_id": TG_CHAT_ID, "text": text, "parse_mode": "HTML"}
         try:
-            r = requests.post(url, json=payload, timeout=15)
+            r = TG_SESSION.post(TG_URL, json=payload, timeout=15)
             app.logger.info("[Telegram] status=%s body=%s", r.status_code, r.text[:300])
             try:
                 j = r.json()
@@ -217,24 +414,17 @@ def create_app():
             app.logger.error("[Mail] MAIL_* not configured correctly")
             return False
 
-        from decimal import Decimal, ROUND_HALF_UP
-
-        def fmt_amount(dec: Decimal, cur: str) -> str:
-            cur = (cur or "USD").upper()
-            if cur == "KHR":
-                return str(int((dec / Decimal("100")).quantize(Decimal("1"), rounding=ROUND_HALF_UP)) * 100)
-            return str(dec.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
-
         fx = Decimal(str(fx_rate or "0")) if (currency or "USD").upper() == "KHR" else Decimal("0")
 
-        lines = []
+        buf = io.StringIO()
+        w = buf.write
         for it in items:
             lt = Decimal(str(it.get("line_total", "0")))
             if fx > 0:
                 lt = lt * fx
-            lines.append(f"- {it.get('qty', 1)} x {it.get('name', '')} ({fmt_amount(lt, currency)} {currency})")
-
-        body = "\n".join(lines) + f"\n\nSubtotal: {subtotal} {currency}\nTime: {datetime.now():%Y-%m-%d %H:%M}"
+            w("- %s x %s (%s %s)\n" % (it.get("qty", 1), it.get("name", ""), fmt_amount(lt, currency), currency))
+        w("\nSubtotal: %s %s\nTime: %s" % (subtotal, currency, datetime.now().strftime(TIME_FMT)))
+        body = buf.getvalue()
 
         msg = Message(
             subject="Your Kimhut Café Invoice",
@@ -246,13 +436,48 @@ def create_app():
             sender=app.config["MAIL_DEFAULT_SENDER"],
         )
         try:
-            mail.send(msg)
+            with mail_connect() as conn:
+                conn.send(msg)
             app.logger.info("[Mail] sent to %s", msg.recipients)
             return True
         except Exception:
             app.logger.exception("[Mail] send failed")
             return False
 
+    def notify_async(label: str, fn, *args):
+        """Run a notifier on the pool. Args must not reference request/session."""
+        def run():
+            with app.app_context():
+                try:
+                    ok = fn(*args)
+                    app.logger.info("[%s] sent=%s", label, ok)
+                    return ok
+                except Exception:
+                    app.logger.exception("[%s] send failed", label)
+                    return False
+        return notify_pool.submit(run)
+
+    def notify_results(*futures) -> list:
+        """Optionally wait for notifier futures (NOTIFY_WAIT).
+
+        They already run concurrently, so this blocks for the slowest one, not the sum.
+        Returns one bool per future (None when not waiting or not submitted).
+        """
+        if not app.config.get("NOTIFY_WAIT"):
+            return [None] * len(futures)
+        pending = [f for f in futures if f is not None]
+        done, _ = wait(pending, timeout=app.config.get("NOTIFY_WAIT_TIMEOUT", 15))
+        results = []
+        for f in futures:
+            if f is None:
+                results.append(None)
+            elif f in done:
+                results.append(f.result())
+            else:
+                app.logger.warning("[Notify] still running after %ss", app.config.get("NOTIFY_WAIT_TIMEOUT", 15))
+                results.append(False)
+        return results
+
     # ---------- Routes ----------
     @app.route("/")
     def home():
@@ -275,7 +500,8 @@ def create_app():
                   "We’ll get back to you as soon as possible.\n\n— Kimhut Café"),
         )
         try:
-            mail.send(msg)
+            with mail_connect() as conn:
+                conn.send(msg)
             return True
         except Exception as e:
             app.logger.exception("[Mail] contact ack failed: %s", e)
@@ -288,15 +514,19 @@ def create_app():
             email = request.form.get("email", "").strip()
             message = request.form.get("message", "").strip()
 
-            from html import escape
             tg_text = (
                 "<b>Contact</b>\n"
                 f"From: {escape(name)} &lt;{escape(email)}&gt;\n\n"
                 f"{escape(message)}"
             )
-            tg_ok = send_telegram(tg_text)
-            ack_ok = send_contact_ack(email, name, message)
-
+            fut_tg = notify_async("Telegram", send_telegram, tg_text)
+            fut_mail = notify_async("Mail", send_contact_ack, email, name, message)
+            tg_ok, ack_ok = notify_results(fut_tg, fut_mail)
+
+            if tg_ok is None:
+                # not waiting: report based on configuration only
+                tg_ok = TG_URL and TG_CHAT_ID
+                ack_ok = email and app.config.get("MAIL_USERNAME")
             if tg_ok or ack_ok:
                 flash("Thanks! Your message was sent.", "success")
             else:
@@ -306,22 +536,37 @@ def create_app():
 
     @app.context_processor
     def inject_nav_categories():
-        cats = sorted(set(p["category"] for p in PRODUCTS))
         sel = (request.args.get("category") or "All")
         q = request.args.get("q", "")
-        return {"categories_nav": cats, "selected_nav_category": sel, "search_q": q}
+        return {"categories_nav": CATEGORIES, "selected_nav_category": sel, "search_q": q}
 
     @app.route("/products")
     def products():
+        # Output depends on the query string and the navbar cart badge; pending flashes skip caching
+        cacheable = "_flashes" not in session
+        if cacheable:
+            key = hashlib.blake2b(request.query_string, digest_size=8)
+            key.update(b"|%d" % get_cart_count())
+            etag = f"{PRODUCTS_ETAG}-{key.hexdigest()}"
+
+        def with_cache_headers(resp):
+            # shared by the 200 and the 304 so their caching headers can't drift apart
+            if cacheable:
+                resp.set_etag(etag, weak=True)
+                resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+
+        if cacheable and request.if_none_match.contains_weak(etag):
+            return with_cache_headers(Response(status=304))
+
         selected = request.args.get("category", "All")
         q = (request.args.get("q") or "").strip().lower()
-        items = PRODUCTS
-        if selected != "All":
-            items = [p for p in items if p["category"].lower() == selected.lower()]
+        items = BY_CATEGORY.get(selected.lower(), [])
         if q:
-            items = [p for p in items if q in p["name"].lower()]
-        categories = ["All"] + sorted(set(p["category"] for p in PRODUCTS))
-        return render_template("products.html", products=items, categories=categories, selected=selected)
+            items = [p for p in items if q in p.name_lc]
+        return with_cache_headers(Response(
+            render_template("products.html", products=items, categories=CATEGORIES_WITH_ALL, selected=selected)
+        ))
 
     @app.route("/cart")
     def cart():
@@ -330,40 +575,50 @@ def create_app():
 
     @app.context_processor
     def inject_cart_count():
-        cart = session.get("cart", {})
-        try:
-            count = sum(int(q) for q in cart.values())
-        except Exception:
-            count = 0
-        return {"cart_count": count}
+        # kept up to date by the cart mutations below
+        return {"cart_count": get_cart_count()}
 
     @app.route("/add-to-cart", methods=["POST"])
     def add_to_cart():
-        pid = request.form.get("product_id")
+        pid = request.form.get("product_id", "")
         qty = int(request.form.get("qty", "1"))
+        # normalise once here so cart_items() can look up without casting
+        pid = str(int(pid)) if pid.strip().isdecimal() else pid
+        cart_count = get_cart_count()
+        wants_json = request.headers.get("X-Requested-With") == "XMLHttpRequest" or request.accept_mimetypes.accept_json
+        # nothing to add: leave the session (and cookie) untouched, no flash
+        if qty <= 0:
+            if wants_json:
+                return jsonify({"ok": False, "cart_count": cart_count}), 400
+            return redirect(url_for("products"))
         cart = session.get("cart", {})
         cart[pid] = cart.get(pid, 0) + qty
         session["cart"] = cart
-        cart_count = sum(int(q) for q in cart.values() if str(q).isdigit())
-        if request.headers.get("X-Requested-With") == "XMLHttpRequest" or request.accept_mimetypes.accept_json:
+        cart_count += qty
+        session["cart_count"] = cart_count
+        if wants_json:
             return jsonify({"ok": True, "cart_count": cart_count})
         flash("Item added to cart.", "success")
         return redirect(url_for("products"))
 
     @app.route("/update-cart", methods=["POST"])
     def update_cart():
-        cart = {}
-        for key, val in request.form.items():
-            if key.startswith("qty_"):
-                pid = key.replace("qty_", "")
-                try:
-                    q = max(0, int(val))
-                    if q > 0:
-                        cart[pid] = q
-                except Exception:
-                    pass
-        session["cart"] = cart
-        flash("Cart updated.", "success")
+        # normalise qty_<id> to the canonical str(int) key cart_items() looks up;
+        # negative/blank quantities and non-numeric ids fail isdecimal(); unknown ids are dropped
+        cart = {
+            pid: q
+            for pid, q in (
+                (str(int(key[4:])), int(val))
+                for key, val in request.form.items()
+                if key.startswith("qty_") and key[4:].isdecimal() and val.isdecimal()
+            )
+            if q > 0 and pid in PRODUCTS_BY_ID
+        }
+        # flashing writes the session too, so a no-op submit must skip both
+        if cart != session.get("cart", {}):
+            session["cart"] = cart
+            session["cart_count"] = sum(cart.values())
+            flash("Cart updated.", "success")
         return redirect(url_for("cart"))
 
     @app.route("/checkout/success")
@@ -436,7 +691,6 @@ def create_app():
                 static=False
             )
             md5 = khqr.generate_md5(qr_payload)
-            from datetime import timedelta
             EXPIRES_SECONDS = 60
             expire_at = (datetime.utcnow() + timedelta(seconds=EXPIRES_SECONDS)).isoformat()
 
@@ -541,25 +795,30 @@ def create_app():
 
         try:
             if not order.get("notified"):
-                # Telegram
-                try:
-                    tg_ok = send_telegram(build_tg_lines(order))
-                    app.logger.info("[Telegram] sent=%s", tg_ok)
-                except Exception:
-                    app.logger.exception("[Telegram] build/send failed")
-
-                # Email
+                # Telegram + Email in the background (snapshot order: it may be the session's dict)
+                snap = copy.deepcopy(order)
+                fut_tg = None
                 try:
-                    mail_ok = send_invoice_email(
-                        order["customer"],
-                        order["items"],
-                        order["subtotal"],
-                        order.get("currency", "USD"),
-                        order.get("fx_rate")
-                    )
-                    app.logger.info("[Mail] sent=%s", mail_ok)
+                    fut_tg = notify_async("Telegram", send_telegram, build_tg_lines(snap))
                 except Exception:
-                    app.logger.exception("[Mail] send failed")
+                    app.logger.exception("[Telegram] build failed")
+
+                fut_mail = notify_async(
+                    "Mail",
+                    send_invoice_email,
+                    snap["customer"],
+                    snap["items"],
+                    snap["subtotal"],
+                    snap.get("currency", "USD"),
+                    snap.get("fx_rate")
+                )
+                tg_ok, mail_ok = notify_results(fut_tg, fut_mail)
+                if app.config.get("NOTIFY_WAIT"):
+                    # keep per-channel outcome on the order so failed sends can be followed up
+                    order["notify_status"] = {"telegram": bool(tg_ok), "mail": bool(mail_ok)}
+                    for channel, ok in order["notify_status"].items():
+                        if not ok:
+                            app.logger.warning("[Notify] %s not confirmed for md5=%s", channel, md5)
 
                 # mark notified
                 order["notified"] = True
@@ -567,6 +826,7 @@ def create_app():
 
                 # clear cart
                 session["cart"] = {}
+                session["cart_count"] = 0
                 session.modified = True
         finally:
             release_notify_lock(md5)
@@ -45,11 +45,16 @@ class BaseConfig:
     MAIL_USERNAME = os.getenv("MAIL_USERNAME")
     MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
     MAIL_DEFAULT_SENDER = os.getenv("MAIL_DEFAULT_SENDER", MAIL_USERNAME)
+    MAIL_TIMEOUT = _to_int(os.getenv("MAIL_TIMEOUT"), 15)
 
     # Telegram
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
     TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+    # Notifications run on a thread pool; set NOTIFY_WAIT to block until they finish
+    NOTIFY_WAIT = _to_bool(os.getenv("NOTIFY_WAIT"), False)
+    NOTIFY_WAIT_TIMEOUT = _to_int(os.getenv("NOTIFY_WAIT_TIMEOUT"), 15)
+
     # Flask specifics
     DEBUG = False
     TESTING = False